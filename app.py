@@ -1,15 +1,20 @@
 import streamlit as st
 import requests
 from pytube import YouTube
-import tempfile
 import os
 from fpdf import FPDF
 from docx import Document
-from groq import Groq
+from quiz_generation import generate_sharded_quiz
+from model_router import complete_with_chunking, PromptTooLarge
+from output_viewer import render_output_viewer
+from scratch_space import scratch_space, ScratchSpaceFull, download_size, render_scratch_space_metric
+
+# Deepgram endpoint; point it at a local stand-in server for testing
+DEEPGRAM_API_URL = os.environ.get("DEEPGRAM_API_URL", "https://api.deepgram.com/v1/listen")
 
 # Function to transcribe audio using Deepgram API
 def transcribe_audio_deepgram(audio_path, api_key):
-    api_url = "https://api.deepgram.com/v1/listen"
+    api_url = DEEPGRAM_API_URL
     headers = {
         "Authorization": f"Token {api_key}",
         "Content-Type": "audio/wav"  # Adjust according to your audio file type
@@ -25,31 +30,35 @@ def transcribe_audio_deepgram(audio_path, api_key):
         st.error(f"Failed to transcribe audio: {response.status_code} {response.text}")
         return ""
 
-# Function to generate notes using OpenAI API
+# Function to build the notes prompt for a transcription
+def build_notes_prompt(transcription):
+    return f"Generate detailed lecture notes and after the notes at the end of the notes, generate a structured document containing discussed topics with associated timestamps from the following transcription:\n\n{transcription}"
+
+# Function to generate notes using Groq API, routed to the fastest model that fits the transcript
 def generate_notes(transcription, api_key):
-    client = Groq(api_key=api_key)
-    prompt = f"Generate detailed lecture notes and after the notes at the end of the notes, generate a structured document containing discussed topics with associated timestamps from the following transcription:\n\n{transcription}"
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
-
-# Function to generate quiz using OpenAI API
+    try:
+        return complete_with_chunking(build_notes_prompt, transcription, api_key, "notes")
+    except PromptTooLarge as e:
+        st.error(f"The transcript is too long to generate notes: {e}")
+        return ""
+
+# Function to generate quiz using Groq API, one request per transcript segment in parallel
 def generate_quiz(transcription, num_questions, api_key):
-    client = Groq(api_key=api_key)
-    prompt = f"Generate {num_questions} multiple-choice questions with answers given at the end for all the questions from the following transcription:\n\n{transcription}"
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
-
-# Function to download audio from YouTube video
-def download_youtube_audio(youtube_url):
+    try:
+        return generate_sharded_quiz(transcription, api_key, num_questions)
+    except PromptTooLarge as e:
+        st.error(f"The transcript is too long to generate a quiz: {e}")
+        return ""
+
+# Function to find the audio stream of a YouTube video
+def get_youtube_audio_stream(youtube_url):
     yt = YouTube(youtube_url)
-    stream = yt.streams.filter(only_audio=True).first()
-    temp_dir = tempfile.mkdtemp()
+    return yt.streams.filter(only_audio=True).first()
+
+# Function to download audio from YouTube video into a job directory
+def download_youtube_audio(stream, temp_dir):
+    if not stream:
+        return None
     temp_file_path = os.path.join(temp_dir, "audio.mp4")
     stream.download(output_path=temp_dir, filename="audio.mp4")
     return temp_file_path
@@ -68,6 +77,20 @@ def create_word_doc(text, file_name):
     doc.add_paragraph(text)
     doc.save(file_name)
 
+# Function to build the PDF and Word exports once per output, so reruns of the viewer do not rebuild them
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_exports(output):
+    with scratch_space.job_dir() as export_dir:
+        pdf_path = os.path.join(export_dir, "export.pdf")
+        create_pdf(output, pdf_path)
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        word_path = os.path.join(export_dir, "export.docx")
+        create_word_doc(output, word_path)
+        with open(word_path, "rb") as f:
+            word_bytes = f.read()
+    return pdf_bytes, word_bytes
+
 # Function to render the homepage
 def render_homepage():
     st.title("AI-Powered Teaching Assistant")
@@ -106,58 +129,58 @@ def render_lecture_notes_page():
     # Transcription and Notes generation section
     if st.button("Generate Notes"):
         if deepgram_api_key and openai_api_key:
-            if audio_file:
-                st.success("Processing the audio file...")
-                # Save the uploaded file temporarily
-                audio_path = f"temp_audio.{audio_file.name.split('.')[-1]}"
-                with open(audio_path, "wb") as f:
-                    f.write(audio_file.getbuffer())
-
-                # Generate the transcription using Deepgram API
-                transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
-
-                # Generate the notes using Groq API
-                if transcription_output:
-                    notes_output = generate_notes(transcription_output, openai_api_key)
-                    st.text_area("Generated Notes", notes_output, height=300)
-
-                    # Download options
-                    st.download_button("Download Notes as TXT", notes_output, file_name="lecture_notes.txt")
-                    pdf_file = f"lecture_notes.pdf"
-                    create_pdf(notes_output, pdf_file)
-                    with open(pdf_file, "rb") as f:
-                        st.download_button("Download Notes as PDF", f, file_name=pdf_file)
-                    word_file = f"lecture_notes.docx"
-                    create_word_doc(notes_output, word_file)
-                    with open(word_file, "rb") as f:
-                        st.download_button("Download Notes as Word Document", f, file_name=word_file)
-
-            elif youtube_url:
-                st.success("Processing the YouTube video...")
-                audio_path = download_youtube_audio(youtube_url)
-                if audio_path:
-                    transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
-                    if transcription_output:
-                        notes_output = generate_notes(transcription_output, openai_api_key)
-                        st.text_area("Generated Notes", notes_output, height=300)
-
-                        # Download options
-                        st.download_button("Download Notes as TXT", notes_output, file_name="lecture_notes.txt")
-                        pdf_file = f"lecture_notes.pdf"
-                        create_pdf(notes_output, pdf_file)
-                        with open(pdf_file, "rb") as f:
-                            st.download_button("Download Notes as PDF", f, file_name=pdf_file)
-                        word_file = f"lecture_notes.docx"
-                        create_word_doc(notes_output, word_file)
-                        with open(word_file, "rb") as f:
-                            st.download_button("Download Notes as Word Document", f, file_name=word_file)
-                else:
-                    st.error("Failed to download YouTube video.")
-            else:
-                st.error("Please upload an audio file or enter a YouTube URL.")
+            try:
+                # Reserve the upload or download size up front so concurrent jobs wait for space
+                stream = get_youtube_audio_stream(youtube_url) if youtube_url and not audio_file else None
+                expected_bytes = audio_file.size if audio_file else download_size(stream) if stream else 0
+                # Work in a job directory that is removed even if processing fails
+                with scratch_space.job_dir(expected_bytes) as temp_dir:
+                    if audio_file:
+                        st.success("Processing the audio file...")
+                        # Save the uploaded file temporarily
+                        audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
+                        with open(audio_path, "wb") as f:
+                            f.write(audio_file.getbuffer())
+
+                        # Generate the transcription using Deepgram API
+                        transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+
+                        # Generate the notes using Groq API
+                        if transcription_output:
+                            notes_output = generate_notes(transcription_output, openai_api_key)
+                            if notes_output:
+                                st.session_state["notes_output"] = notes_output
+
+                    elif youtube_url:
+                        st.success("Processing the YouTube video...")
+                        audio_path = download_youtube_audio(stream, temp_dir)
+                        if audio_path:
+                            transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+                            if transcription_output:
+                                notes_output = generate_notes(transcription_output, openai_api_key)
+                                if notes_output:
+                                    st.session_state["notes_output"] = notes_output
+                        else:
+                            st.error("Failed to download YouTube video.")
+                    else:
+                        st.error("Please upload an audio file or enter a YouTube URL.")
+            except ScratchSpaceFull as e:
+                st.error(f"Server is busy: {e}")
         else:
             st.error("Please enter both Deepgram and Groq API keys.")
 
+    # Render the stored notes and download options
+    if "notes_output" in st.session_state:
+        notes_output = st.session_state["notes_output"]
+        render_output_viewer(notes_output, "notes")
+        st.download_button("Download Notes as TXT", notes_output, file_name="lecture_notes.txt")
+        try:
+            pdf_bytes, word_bytes = build_exports(notes_output)
+            st.download_button("Download Notes as PDF", pdf_bytes, file_name="lecture_notes.pdf")
+            st.download_button("Download Notes as Word Document", word_bytes, file_name="lecture_notes.docx")
+        except ScratchSpaceFull as e:
+            st.error(f"Server is busy: {e}")
+
 # Function to render the quiz generation page
 def render_quiz_generation_page():
     st.title("Quiz Generation")
@@ -167,7 +190,7 @@ def render_quiz_generation_page():
 
     # Settings section
     st.header("Settings")
-    num_questions = st.slider("Number of questions to generate", min_value=5, max_value=20, value=10, key="quiz_num_questions")
+    num_questions = st.slider("Number of questions to generate", min_value=5, max_value=50, value=10, key="quiz_num_questions")
 
     # API key inputs
     st.header("API Keys")
@@ -177,58 +200,58 @@ def render_quiz_generation_page():
     # Transcription and Quiz generation section
     if st.button("Generate Quiz"):
         if deepgram_api_key and openai_api_key:
-            if audio_file:
-                st.success("Processing the audio file...")
-                # Save the uploaded file temporarily
-                audio_path = f"temp_audio.{audio_file.name.split('.')[-1]}"
-                with open(audio_path, "wb") as f:
-                    f.write(audio_file.getbuffer())
-
-                # Generate the transcription using Deepgram API
-                transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
-
-                # Generate the quiz using Groq API
-                if transcription_output:
-                    quiz_output = generate_quiz(transcription_output, num_questions, openai_api_key)
-                    st.text_area("Generated Quiz", quiz_output, height=300)
-
-                    # Download options
-                    st.download_button("Download Quiz as TXT", quiz_output, file_name="quiz.txt")
-                    pdf_file = f"quiz.pdf"
-                    create_pdf(quiz_output, pdf_file)
-                    with open(pdf_file, "rb") as f:
-                        st.download_button("Download Quiz as PDF", f, file_name=pdf_file)
-                    word_file = f"quiz.docx"
-                    create_word_doc(quiz_output, word_file)
-                    with open(word_file, "rb") as f:
-                        st.download_button("Download Quiz as Word Document", f, file_name=word_file)
-
-            elif youtube_url:
-                st.success("Processing the YouTube video...")
-                audio_path = download_youtube_audio(youtube_url)
-                if audio_path:
-                    transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
-                    if transcription_output:
-                        quiz_output = generate_quiz(transcription_output, num_questions, openai_api_key)
-                        st.text_area("Generated Quiz", quiz_output, height=300)
-
-                        # Download options
-                        st.download_button("Download Quiz as TXT", quiz_output, file_name="quiz.txt")
-                        pdf_file = f"quiz.pdf"
-                        create_pdf(quiz_output, pdf_file)
-                        with open(pdf_file, "rb") as f:
-                            st.download_button("Download Quiz as PDF", f, file_name=pdf_file)
-                        word_file = f"quiz.docx"
-                        create_word_doc(quiz_output, word_file)
-                        with open(word_file, "rb") as f:
-                            st.download_button("Download Quiz as Word Document", f, file_name=word_file)
-                else:
-                    st.error("Failed to download YouTube video.")
-            else:
-                st.error("Please upload an audio file or enter a YouTube URL.")
+            try:
+                # Reserve the upload or download size up front so concurrent jobs wait for space
+                stream = get_youtube_audio_stream(youtube_url) if youtube_url and not audio_file else None
+                expected_bytes = audio_file.size if audio_file else download_size(stream) if stream else 0
+                # Work in a job directory that is removed even if processing fails
+                with scratch_space.job_dir(expected_bytes) as temp_dir:
+                    if audio_file:
+                        st.success("Processing the audio file...")
+                        # Save the uploaded file temporarily
+                        audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
+                        with open(audio_path, "wb") as f:
+                            f.write(audio_file.getbuffer())
+
+                        # Generate the transcription using Deepgram API
+                        transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+
+                        # Generate the quiz using Groq API
+                        if transcription_output:
+                            quiz_output = generate_quiz(transcription_output, num_questions, openai_api_key)
+                            if quiz_output:
+                                st.session_state["quiz_output"] = quiz_output
+
+                    elif youtube_url:
+                        st.success("Processing the YouTube video...")
+                        audio_path = download_youtube_audio(stream, temp_dir)
+                        if audio_path:
+                            transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+                            if transcription_output:
+                                quiz_output = generate_quiz(transcription_output, num_questions, openai_api_key)
+                                if quiz_output:
+                                    st.session_state["quiz_output"] = quiz_output
+                        else:
+                            st.error("Failed to download YouTube video.")
+                    else:
+                        st.error("Please upload an audio file or enter a YouTube URL.")
+            except ScratchSpaceFull as e:
+                st.error(f"Server is busy: {e}")
         else:
             st.error("Please enter both Deepgram and Groq API keys.")
 
+    # Render the stored quiz and download options
+    if "quiz_output" in st.session_state:
+        quiz_output = st.session_state["quiz_output"]
+        render_output_viewer(quiz_output, "quiz")
+        st.download_button("Download Quiz as TXT", quiz_output, file_name="quiz.txt")
+        try:
+            pdf_bytes, word_bytes = build_exports(quiz_output)
+            st.download_button("Download Quiz as PDF", pdf_bytes, file_name="quiz.pdf")
+            st.download_button("Download Quiz as Word Document", word_bytes, file_name="quiz.docx")
+        except ScratchSpaceFull as e:
+            st.error(f"Server is busy: {e}")
+
 # Function to render the footer
 def render_footer():
     st.markdown("---")
@@ -238,6 +261,7 @@ def render_footer():
 def main():
     st.sidebar.title("Navigation")
     page = st.sidebar.radio("Go to", ["Home", "Lecture Notes", "Quiz Generation"])
+    render_scratch_space_metric()
 
     if page == "Home":
         render_homepage()
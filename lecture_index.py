@@ -0,0 +1,108 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+
+LECTURE_INDEX_PATH = os.environ.get("LECTURE_INDEX_PATH", "lecture_index.db")
+# Transcript words grouped into one searchable passage
+PASSAGE_WORDS = 60
+DEFAULT_SEARCH_LIMIT = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lectures (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    duration_ms INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS lecture_text USING fts5(
+    content,
+    lecture_id UNINDEXED,
+    kind UNINDEXED,
+    start_ms UNINDEXED,
+    end_ms UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+# Function to open the lecture index, creating its tables on first use
+def get_connection(path=LECTURE_INDEX_PATH):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Function to group Deepgram words into passages with start and end offsets in milliseconds
+def passages_from_words(words, passage_words=PASSAGE_WORDS):
+    passages = []
+    for i in range(0, len(words), passage_words):
+        group = words[i:i + passage_words]
+        text = " ".join(word.get("punctuated_word") or word.get("word", "") for word in group)
+        passages.append((text, int(group[0]["start"] * 1000), int(group[-1]["end"] * 1000)))
+    return passages
+
+
+# Function to split generated text into paragraph passages without time offsets
+def passages_from_text(text):
+    return [(paragraph.strip(), None, None) for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+
+
+# Function to build transcript passages, using word timings when Deepgram returned them
+def passages_from_transcript(transcription, words=None):
+    if words:
+        return passages_from_words(words)
+    return passages_from_text(transcription)
+
+
+# Function to store a lecture and its transcript passages in the index
+def index_lecture(title, source, passages, path=LECTURE_INDEX_PATH):
+    duration_ms = max((end for _, _, end in passages if end is not None), default=None)
+    created_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with closing(get_connection(path)) as conn, conn:
+        lecture_id = conn.execute(
+            "INSERT INTO lectures (title, source, created_at, duration_ms) VALUES (?, ?, ?, ?)",
+            (title, source, created_at, duration_ms)
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO lecture_text (content, lecture_id, kind, start_ms, end_ms) VALUES (?, ?, 'transcript', ?, ?)",
+            [(text, lecture_id, start_ms, end_ms) for text, start_ms, end_ms in passages]
+        )
+    return lecture_id
+
+
+# Function to add generated notes or a quiz to an indexed lecture
+def add_lecture_document(lecture_id, kind, text, path=LECTURE_INDEX_PATH):
+    with closing(get_connection(path)) as conn, conn:
+        conn.execute("DELETE FROM lecture_text WHERE lecture_id = ? AND kind = ?", (lecture_id, kind))
+        conn.executemany(
+            "INSERT INTO lecture_text (content, lecture_id, kind, start_ms, end_ms) VALUES (?, ?, ?, ?, ?)",
+            [(passage, lecture_id, kind, start_ms, end_ms) for passage, start_ms, end_ms in passages_from_text(text)]
+        )
+
+
+# Function to turn free text into an FTS5 query that matches all of its terms
+def build_match_query(query):
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"' for term in terms)
+
+
+# Function to search all indexed lectures, best matches first
+def search_lectures(query, limit=DEFAULT_SEARCH_LIMIT, path=LECTURE_INDEX_PATH):
+    match_query = build_match_query(query)
+    if not match_query:
+        return []
+    with closing(get_connection(path)) as conn:
+        rows = conn.execute(
+            """SELECT l.id, l.title, l.source, l.created_at, t.kind, t.start_ms, t.end_ms,
+                      snippet(lecture_text, 0, '**', '**', '...', 16)
+               FROM lecture_text t JOIN lectures l ON l.id = t.lecture_id
+               WHERE lecture_text MATCH ?
+               ORDER BY bm25(lecture_text)
+               LIMIT ?""",
+            (match_query, limit)
+        ).fetchall()
+    keys = ["lecture_id", "title", "source", "created_at", "kind", "start_ms", "end_ms", "snippet"]
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,90 @@
+import os
+import uuid
+import requests
+from model_router import route_completion
+
+# Deepgram endpoint used for live chunks; point it at a local stand-in server for testing
+DEEPGRAM_API_URL = os.environ.get("DEEPGRAM_API_URL", "https://api.deepgram.com/v1/listen")
+# Default number of seconds of new audio to collect before the notes are updated
+DEFAULT_UPDATE_INTERVAL = 180
+# Amount of the existing notes sent along with each new segment for context
+NOTES_CONTEXT_CHARS = 2000
+
+
+# Function to format a number of seconds as a lecture timestamp
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+# Function to transcribe a single chunk of live audio using Deepgram API
+def transcribe_audio_chunk(chunk, api_key, content_type="audio/wav", api_url=DEEPGRAM_API_URL):
+    response = requests.post(api_url, headers={"Authorization": f"Token {api_key}", "Content-Type": content_type}, data=chunk, timeout=60)
+    response.raise_for_status()
+    result = response.json()
+    transcript = result.get('results', {}).get('channels', [])[0].get('alternatives', [])[0].get('transcript', "")
+    duration = result.get('metadata', {}).get('duration', 0.0)
+    return transcript, duration
+
+
+# Function to summarize only the newly arrived segment of a live lecture using Groq API
+def summarize_live_segment(segment_text, api_key, start, end, previous_notes=""):
+    prompt = f"""Create concise lecture notes for the following new segment of a live lecture, recorded from {format_timestamp(start)} to {format_timestamp(end)}. Highlight important topics and associated timestamps.
+    Only cover the new segment and do not repeat what is already in the notes so far."""
+    if previous_notes:
+        prompt += f"\n\nNotes so far (most recent part):\n\n{previous_notes[-NOTES_CONTEXT_CHARS:]}"
+    prompt += f"\n\nNew segment transcription:\n\n{segment_text}"
+    return route_completion(prompt, api_key, "notes")
+
+
+# Rolling notes for a lecture that is transcribed chunk by chunk as it is captured
+class LiveLectureSession:
+    def __init__(self, deepgram_api_key, groq_api_key, update_interval=DEFAULT_UPDATE_INTERVAL, api_url=DEEPGRAM_API_URL):
+        self.id = uuid.uuid4().hex  # stable for the whole session, unlike id() which is reused once the session is gone
+        self.deepgram_api_key = deepgram_api_key
+        self.groq_api_key = groq_api_key
+        self.update_interval = update_interval
+        self.api_url = api_url
+        self.segments = []  # (start, end, transcript) for every transcribed chunk
+        self.notes = ""
+        self.elapsed = 0.0
+        self.chunks_received = 0
+        self.last_chunk_id = None  # id of the last recording handed to add_chunk, so reruns do not process it again
+        self.summarized_segments = 0
+        self.summarized_until = 0.0
+
+    @property
+    def transcript(self):
+        return "\n".join(f"[{format_timestamp(start)}] {text}" for start, _, text in self.segments)
+
+    @property
+    def pending_duration(self):
+        return self.elapsed - self.summarized_until
+
+    # Transcribe a new chunk of audio and tell whether enough new audio has arrived to update the notes
+    def add_chunk(self, chunk, content_type="audio/wav"):
+        transcript, duration = transcribe_audio_chunk(chunk, self.deepgram_api_key, content_type, self.api_url)
+        start = self.elapsed
+        self.elapsed += duration
+        self.chunks_received += 1
+        if transcript:
+            self.segments.append((start, self.elapsed, transcript))
+        return self.pending_duration >= self.update_interval
+
+    # Summarize the segments that arrived since the last update and merge them into the notes
+    def update_notes(self):
+        new_segments = self.segments[self.summarized_segments:]
+        if not new_segments:
+            return False
+        start, end = new_segments[0][0], new_segments[-1][1]
+        segment_text = "\n".join(f"[{format_timestamp(s)}] {text}" for s, _, text in new_segments)
+        segment_notes = summarize_live_segment(segment_text, self.groq_api_key, start, end, self.notes)
+        heading = f"### {format_timestamp(start)} - {format_timestamp(end)}"
+        self.notes = f"{self.notes}\n\n{heading}\n\n{segment_notes}".strip()
+        self.summarized_segments = len(self.segments)
+        self.summarized_until = self.elapsed
+        return True
@@ -0,0 +1,351 @@
+# Concurrent-session load test for the Streamlit apps.
+#
+# Drives simulated sessions through the Notes/Quiz flows headlessly with Streamlit's
+# AppTest, against local fake Deepgram, Groq and YouTube servers, and reports latency,
+# memory, threads and throughput at each concurrency level. Example:
+#
+#     python load_test.py --app mainH --flow both --levels 1,2,4,8,16 --json results.json
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from streamlit.logger import get_logger
+
+# Page, YouTube URL input key, button label and expected session state outputs per app and flow
+FLOWS = {
+    "mainH": {
+        "notes": ("Notes and Quiz Generation", "notes_quiz_youtube_url", "Generate Notes", ["notes_output"]),
+        "quiz": ("Notes and Quiz Generation", "notes_quiz_youtube_url", "Generate Quiz", ["quiz_output"]),
+        "both": ("Notes and Quiz Generation", "notes_quiz_youtube_url", "Generate Notes and Quiz", ["notes_output", "quiz_output"]),
+    },
+    "main1": {
+        "notes": ("Lecture Notes", "notes_youtube_url", "Generate Notes", ["notes_output"]),
+        "quiz": ("Quiz Generation", "quiz_youtube_url", "Generate Quiz", ["quiz_output"]),
+        "both": ("Lecture Notes", "notes_youtube_url", "Generate", ["notes_output", "quiz_output"]),
+    },
+}
+
+VOCABULARY = ("matrix vector eigenvalue basis span kernel rank determinant transform projection "
+              "orthogonal symmetric diagonal inverse linear subspace dimension coordinate scalar "
+              "norm angle length product trace identity column row pivot echelon system solution "
+              "equation variable function limit derivative integral series sequence bound proof "
+              "theorem lemma example definition graph node edge path cycle tree weight flow").split()
+
+
+# Fake Deepgram, Groq and YouTube endpoints with configurable latency
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    config = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if not self.path.startswith("/youtube/"):
+            self.send_error(404)
+            return
+        time.sleep(self.config["youtube_latency"])
+        body = os.urandom(self.config["audio_bytes"])
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mp4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.startswith("/v1/listen"):
+            self.read_body()
+            time.sleep(self.config["deepgram_latency"])
+            self.send_json(fake_deepgram_response(self.config["transcript_words"]))
+        elif self.path.startswith("/openai/v1/chat/completions"):
+            request = json.loads(self.read_body())
+            time.sleep(self.config["groq_latency"])
+            self.send_json(fake_groq_response(request))
+        else:
+            self.send_error(404)
+
+
+# Function to build a Deepgram response with word timings
+def fake_deepgram_response(num_words):
+    rng = random.Random(num_words)
+    words = [{"word": rng.choice(VOCABULARY), "start": i * 0.4, "end": i * 0.4 + 0.3} for i in range(num_words)]
+    for word in words:
+        word["punctuated_word"] = word["word"]
+    transcript = " ".join(word["word"] for word in words)
+    return {
+        "metadata": {"duration": num_words * 0.4},
+        "results": {"channels": [{"alternatives": [{"transcript": transcript, "words": words}]}]},
+    }
+
+
+# Function to build a Groq chat completion, with parseable questions for quiz prompts
+def fake_groq_response(request):
+    prompt = request["messages"][-1]["content"]
+    rng = random.Random()
+    if "multiple-choice" in prompt:
+        count = int(re.search(r"Generate (\d+)", prompt).group(1))
+        blocks = []
+        for _ in range(count):
+            options = [f"{letter}) {' '.join(rng.sample(VOCABULARY, 3))}" for letter in "ABCD"]
+            blocks.append("\n".join([f"Question: Which statement about {' '.join(rng.sample(VOCABULARY, 6))} is true?"] + options + ["Answer: A"]))
+        content = "\n\n".join(blocks)
+    else:
+        content = "\n\n".join(f"## {rng.choice(VOCABULARY).title()}\n\n{' '.join(rng.choices(VOCABULARY, k=80))}" for _ in range(8))
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{rng.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+# Stand-in for pytube.YouTube that downloads the audio from the fake YouTube server
+class LocalYouTube:
+    base_url = None
+
+    def __init__(self, url):
+        self.streams = LocalStreams(f"{self.base_url}/youtube/{url.rsplit('=', 1)[-1]}")
+
+
+class LocalStreams:
+    filesize = None
+
+    def __init__(self, url):
+        self.url = url
+
+    def filter(self, **kwargs):
+        return self
+
+    def first(self):
+        return self
+
+    def download(self, output_path, filename):
+        response = requests.get(self.url, timeout=60)
+        response.raise_for_status()
+        file_path = os.path.join(output_path, filename)
+        with open(file_path, "wb") as f:
+            f.write(response.content)
+        return file_path
+
+
+# Function to keep a Streamlit runtime available while sessions overlap. AppTest installs a mock runtime
+# for each script run and clears it when the run ends, which breaks runs still going on other threads.
+def share_streamlit_runtime():
+    from streamlit.runtime import Runtime
+    last_runtime = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last_runtime["instance"] = cls._instance
+        runtime = cls._instance or last_runtime.get("instance")
+        if runtime is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return runtime
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "instance" in last_runtime)
+
+
+# Script run by AppTest for every simulated session
+def run_app(app_module):
+    import importlib
+    importlib.import_module(app_module).main()
+
+
+# Function to read the resident memory of this process in bytes
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Samples peak memory and thread count while a concurrency level runs
+class ResourceSampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_rss = current_rss()
+        self.peak_threads = threading.active_count()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# Function to drive one simulated session through a flow and time it end to end
+def run_session(app_module, flow, session_number, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    page, url_key, button_label, outputs = FLOWS[app_module][flow]
+    start = time.perf_counter()
+    try:
+        at = AppTest.from_function(run_app, args=(app_module,), default_timeout=timeout)
+        at.session_state["deepgram_api_key"] = "fake-deepgram-key"
+        at.session_state["groq_api_key"] = "fake-groq-key"
+        at.run()
+        at.sidebar.radio[0].set_value(page).run()
+        at.text_input(key=url_key).set_value(f"https://www.youtube.com/watch?v=lecture{session_number}").run()
+        next(button for button in at.button if button.label == button_label).click().run()
+    except Exception as e:
+        return time.perf_counter() - start, [f"{type(e).__name__}: {e}"]
+    errors = [str(exception.value) for exception in at.exception] + [str(error.value) for error in at.error]
+    errors += [f"missing {output}" for output in outputs if output not in at.session_state]
+    return time.perf_counter() - start, errors
+
+
+# Below this many successful sessions the 99th percentile is just the slowest session, so it is not reported
+MIN_P99_SESSIONS = 100
+
+
+# Function to take the nearest-rank percentile of a list of values
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+# Function to run a number of sessions at a fixed concurrency and summarize them
+def run_level(app_module, flow, concurrency, sessions, timeout, baseline_rss):
+    sampler = ResourceSampler()
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda n: run_session(app_module, flow, n, timeout), range(sessions)))
+    wall_time = time.perf_counter() - start
+    sampler.stop()
+
+    latencies = [latency for latency, errors in results if not errors]
+    failures = [errors for _, errors in results if errors]
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "succeeded": len(latencies),
+        "failed": len(failures),
+        "p50_seconds": percentile(latencies, 50) if latencies else None,
+        "p99_seconds": percentile(latencies, 99) if len(latencies) >= MIN_P99_SESSIONS else None,
+        "throughput_per_second": len(latencies) / wall_time,
+        "peak_threads": sampler.peak_threads,
+        # Peak process memory above the post-warm-up baseline, shared out over the concurrent sessions.
+        # Memory freed by earlier levels is reused, so the baseline is fixed rather than taken per level.
+        "memory_per_session_mb": max(0, sampler.peak_rss - baseline_rss) / concurrency / 1024 ** 2,
+        "sample_errors": failures[0] if failures else [],
+    }
+
+
+REPORT_HEADER = f"{'conc':>5} {'ok':>5} {'fail':>5} {'p50 s':>8} {'p99 s':>8} {'sess/s':>8} {'threads':>8} {'MB/sess':>8}"
+
+
+# Function to print the summary of one concurrency level
+def print_level(r):
+    p50 = f"{r['p50_seconds']:.2f}" if r["p50_seconds"] is not None else "-"
+    p99 = f"{r['p99_seconds']:.2f}" if r["p99_seconds"] is not None else "-"
+    print(f"{r['concurrency']:>5} {r['succeeded']:>5} {r['failed']:>5} {p50:>8} {p99:>8} {r['throughput_per_second']:>8.2f} {r['peak_threads']:>8} {r['memory_per_session_mb']:>8.1f}", flush=True)
+    if r["p99_seconds"] is None and r["succeeded"]:
+        print(f"      p99 needs at least {MIN_P99_SESSIONS} successful sessions, raise --sessions-per-level", flush=True)
+    if r["sample_errors"]:
+        print(f"      first failure: {'; '.join(r['sample_errors'])}", flush=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the Teaching Assistant apps with simulated concurrent sessions.")
+    parser.add_argument("--app", choices=sorted(FLOWS), default="mainH")
+    parser.add_argument("--flow", choices=["notes", "quiz", "both"], default="both")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma separated concurrency levels to ramp through")
+    parser.add_argument("--sessions-per-level", type=int, default=0, help=f"sessions per level, defaults to twice the concurrency; p99 is only reported from {MIN_P99_SESSIONS} successful sessions")
+    parser.add_argument("--warm-up-sessions", type=int, default=3, help="unmeasured sessions run before the first level")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed for each script run")
+    parser.add_argument("--deepgram-latency", type=float, default=0.5)
+    parser.add_argument("--groq-latency", type=float, default=1.0)
+    parser.add_argument("--youtube-latency", type=float, default=0.2)
+    parser.add_argument("--transcript-words", type=int, default=3000)
+    parser.add_argument("--audio-kb", type=int, default=512)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    FakeServiceHandler.config = {
+        "deepgram_latency": args.deepgram_latency,
+        "groq_latency": args.groq_latency,
+        "youtube_latency": args.youtube_latency,
+        "transcript_words": args.transcript_words,
+        "audio_bytes": args.audio_kb * 1024,
+    }
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServiceHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # The apps read these when they are imported, so set them before the first session
+    work_dir = tempfile.mkdtemp(prefix="load-test-")
+    os.environ["DEEPGRAM_API_URL"] = f"{base_url}/v1/listen"
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["SCRATCH_ROOT"] = os.path.join(work_dir, "scratch")
+    os.environ["LECTURE_INDEX_PATH"] = os.path.join(work_dir, "lecture_index.db")
+    LocalYouTube.base_url = base_url
+    LocalStreams.filesize = args.audio_kb * 1024
+    import importlib
+    importlib.import_module(args.app).YouTube = LocalYouTube
+
+    # Silence warnings about the apps' empty widget labels and about session state set from harness threads
+    for logger_name in ["streamlit.elements.lib.policies", "streamlit.runtime.scriptrunner_utils.script_run_context"]:
+        get_logger(logger_name).disabled = True
+
+    share_streamlit_runtime()
+
+    # Unmeasured sessions first, so one-time imports, caches and allocator growth are not counted against the first level
+    for session_number in range(args.warm_up_sessions):
+        _, warm_up_errors = run_session(args.app, args.flow, -1 - session_number, args.timeout)
+        if warm_up_errors:
+            print(f"warm-up session failed: {'; '.join(warm_up_errors)}", flush=True)
+
+    baseline_rss = current_rss()
+
+    print(REPORT_HEADER, flush=True)
+    results = []
+    for concurrency in [int(level) for level in args.levels.split(",")]:
+        sessions = args.sessions_per_level or 2 * concurrency
+        results.append(run_level(args.app, args.flow, concurrency, sessions, args.timeout, baseline_rss))
+        print_level(results[-1])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"app": args.app, "flow": args.flow, "settings": vars(args), "levels": results}, f, indent=2)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,30 @@
 import streamlit as st
 import requests
 from pytube import YouTube
-import tempfile
-import shutil
 import os
 from fpdf import FPDF
 from docx import Document
 import fitz
-from groq import Groq
+from quiz_generation import generate_sharded_quiz
+from model_router import complete_with_chunking, PromptTooLarge
+from output_viewer import render_output_viewer
+from scratch_space import scratch_space, ScratchSpaceFull, download_size, render_scratch_space_metric
 
-def get_temp_dir():
-    return tempfile.mkdtemp()
+DEEPGRAM_API_URL = os.environ.get("DEEPGRAM_API_URL", "https://api.deepgram.com/v1/listen")
 
-def download_youtube_audio(youtube_url, temp_dir):
+def get_youtube_audio_stream(youtube_url):
     try:
         yt = YouTube(youtube_url)
         stream = yt.streams.filter(only_audio=True).first()
         if not stream:
             raise ValueError("No audio stream found in the YouTube video.")
+        return stream
+    except Exception as e:
+        st.error(f"Error downloading YouTube video: {e}")
+        return None
+
+def download_youtube_audio(stream, temp_dir):
+    try:
         temp_file_path = os.path.join(temp_dir, "audio.mp4")
         stream.download(output_path=temp_dir, filename="audio.mp4")
         return temp_file_path
@@ -25,13 +32,10 @@ def download_youtube_audio(youtube_url, temp_dir):
         st.error(f"Error downloading YouTube video: {e}")
         return None
 
-def clean_up_temp_files(temp_dir):
-    shutil.rmtree(temp_dir)
-
 def transcribe_audio_deepgram(audio_path, api_key):
     try:
         with open(audio_path, "rb") as audio_file:
-            response = requests.post("https://api.deepgram.com/v1/listen", headers={"Authorization": f"Token {api_key}", "Content-Type": "audio/wav"}, data=audio_file)
+            response = requests.post(DEEPGRAM_API_URL, headers={"Authorization": f"Token {api_key}", "Content-Type": "audio/wav"}, data=audio_file)
         response.raise_for_status()
         transcription = response.json().get('results', {}).get('channels', [])[0].get('alternatives', [])[0].get('transcript')
         return transcription
@@ -40,20 +44,30 @@ def transcribe_audio_deepgram(audio_path, api_key):
         return ""
 
 def transcribe_audio_and_get_transcription(audio_file, youtube_url, deepgram_api_key):
-    temp_dir = get_temp_dir()
-
+    transcription_output = ""
+    expected_bytes = 0
     if audio_file:
-        audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
-        with open(audio_path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
-
+        expected_bytes = audio_file.size
     elif youtube_url:
-        audio_path = download_youtube_audio(youtube_url, temp_dir)
-        if audio_path:
-            transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+        stream = get_youtube_audio_stream(youtube_url)
+        if not stream:
+            return transcription_output
+        expected_bytes = download_size(stream)
+    try:
+        with scratch_space.job_dir(expected_bytes) as temp_dir:
+            if audio_file:
+                audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
+                with open(audio_path, "wb") as f:
+                    f.write(audio_file.getbuffer())
+                transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+
+            elif youtube_url:
+                audio_path = download_youtube_audio(stream, temp_dir)
+                if audio_path:
+                    transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+    except ScratchSpaceFull as e:
+        st.error(f"Server is busy: {e}")
 
-    clean_up_temp_files(temp_dir)
     return transcription_output
 
 def extract_text_from_pdf(file):
@@ -67,26 +81,26 @@ def extract_text_from_docx(file):
     doc = Document(file)
     return "\n".join([para.text for para in doc.paragraphs])
 
-def generate_notes(transcription, api_key, lesson_plan_text=None):
-    client = Groq(api_key=api_key)
+def build_notes_prompt(transcription, lesson_plan_text=None):
     prompt = f"""Create detailed lecture notes summarizing the key concepts discussed in the provided transcription. Highlight important topics and keep the notes concise and organized.
                After the notes, create a structured document with the discussed topics and associated timestamps from the original transcription. Ensure the timestamps accurately reflect the timing of each topic's discussion:\n\n{transcription}"""
     if lesson_plan_text:
         prompt += f"\n\nPlease ensure the notes align with the following lesson plan:\n\n{lesson_plan_text}"
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    return prompt
+
+def generate_notes(transcription, api_key, lesson_plan_text=None):
+    try:
+        return complete_with_chunking(lambda text: build_notes_prompt(text, lesson_plan_text), transcription, api_key, "notes")
+    except PromptTooLarge as e:
+        st.error(f"The transcript is too long to generate notes: {e}")
+        return ""
 
 def generate_quiz(transcription, api_key, num_questions):
-    client = Groq(api_key=api_key)
-    prompt = f"Generate {num_questions} multiple-choice questions with answers given at the end for all the questions, keep a balance of asy , moderate and difficult questions from the following transcription:\n\n{transcription}"
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    try:
+        return generate_sharded_quiz(transcription, api_key, num_questions)
+    except PromptTooLarge as e:
+        st.error(f"The transcript is too long to generate a quiz: {e}")
+        return ""
 
 def create_pdf(text, file_name):
     pdf = FPDF()
@@ -123,41 +137,49 @@ def render_inputs(key):
     return audio_file, youtube_url
 
 def process_audio(audio_file, youtube_url, generate_func, num_questions=None, lesson_plan_text=None):
-    temp_dir = get_temp_dir()
-
     if audio_file:
         st.success("Processing the audio file...")
-        audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
-        with open(audio_path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        transcription_output = transcribe_audio_deepgram(audio_path, st.session_state["deepgram_api_key"])
-
     elif youtube_url:
         st.success("Processing the YouTube video...")
-        audio_path = download_youtube_audio(youtube_url, temp_dir)
-        if audio_path:
-            transcription_output = transcribe_audio_deepgram(audio_path, st.session_state["deepgram_api_key"])
+    transcription_output = transcribe_audio_and_get_transcription(audio_file, youtube_url, st.session_state["deepgram_api_key"])
 
     if transcription_output:
         if generate_func.__name__ == "generate_notes":
             output = generate_func(transcription_output, st.session_state["groq_api_key"], lesson_plan_text)
+            if output:
+                st.session_state["notes_output"] = output
         else:
             output = generate_func(transcription_output, st.session_state["groq_api_key"], num_questions)
-        st.text_area("Generated Output", output, height=300)
-        render_download_options(output, generate_func.__name__)
-
-    clean_up_temp_files(temp_dir)
+            if output:
+                st.session_state["quiz_output"] = output
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_exports(output):
+    with scratch_space.job_dir() as export_dir:
+        pdf_path = os.path.join(export_dir, "export.pdf")
+        create_pdf(output, pdf_path)
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        word_path = os.path.join(export_dir, "export.docx")
+        create_word_doc(output, word_path)
+        with open(word_path, "rb") as f:
+            word_bytes = f.read()
+    return pdf_bytes, word_bytes
 
 def render_download_options(output, output_type):
     st.download_button(f"Download {output_type} as TXT", output, file_name=f"{output_type}.txt")
-    pdf_file = f"{output_type}.pdf"
-    create_pdf(output, pdf_file)
-    with open(pdf_file, "rb") as f:
-        st.download_button(f"Download {output_type} as PDF", f, file_name=pdf_file)
-    word_file = f"{output_type}.docx"
-    create_word_doc(output, word_file)
-    with open(word_file, "rb") as f:
-        st.download_button(f"Download {output_type} as Word Document", f, file_name=word_file)
+    try:
+        pdf_bytes, word_bytes = build_exports(output)
+    except ScratchSpaceFull as e:
+        st.error(f"Server is busy: {e}")
+        return
+    st.download_button(f"Download {output_type} as PDF", pdf_bytes, file_name=f"{output_type}.pdf")
+    st.download_button(f"Download {output_type} as Word Document", word_bytes, file_name=f"{output_type}.docx")
+
+def render_stored_output(output_type):
+    if f"{output_type}_output" in st.session_state:
+        render_output_viewer(st.session_state[f"{output_type}_output"], output_type)
+        render_download_options(st.session_state[f"{output_type}_output"], output_type)
 
 def render_lecture_notes_page():
     st.title("Lecture Notes Generation")
@@ -186,22 +208,24 @@ def render_lecture_notes_page():
         process_audio(audio_file, youtube_url, generate_notes, lesson_plan_text=lesson_plan_text)
 
     st.markdown("<h3 style='font-family:Georgia; font-size:20px;'>Generate Notes and Quiz</h3>", unsafe_allow_html=True)
-    num_questions = st.number_input("Number of quiz questions", min_value=5, max_value=20, value=10, step=1, key="combined_num_questions")
+    num_questions = st.number_input("Number of quiz questions", min_value=5, max_value=50, value=10, step=1, key="combined_num_questions")
 
     if st.button("Generate"):
         if audio_file or youtube_url:
             combined_transcription = transcribe_audio_and_get_transcription(audio_file, youtube_url, st.session_state["deepgram_api_key"])
             if combined_transcription:
                 notes_output = generate_notes(combined_transcription, st.session_state["groq_api_key"], lesson_plan_text)
-                st.text_area("Generated Notes", notes_output, height=300)
-                render_download_options(notes_output, "notes")
-
+                if notes_output:
+                    st.session_state["notes_output"] = notes_output
                 quiz_output = generate_quiz(combined_transcription, st.session_state["groq_api_key"], int(num_questions))
-                st.text_area("Generated Quiz", quiz_output, height=300)
-                render_download_options(quiz_output, "quiz")
+                if quiz_output:
+                    st.session_state["quiz_output"] = quiz_output
         else:
             st.error("Please upload an audio file or enter a YouTube URL.")
 
+    render_stored_output("notes")
+    render_stored_output("quiz")
+
 def render_quiz_generation_page():
     st.title("Quiz Generation")
 
@@ -214,11 +238,13 @@ def render_quiz_generation_page():
         youtube_url = st.text_input("", key="quiz_youtube_url")
 
     st.header("Settings")
-    num_questions = st.slider("Number of questions to generate", min_value=5, max_value=20, value=10, key="quiz_num_questions")
+    num_questions = st.slider("Number of questions to generate", min_value=5, max_value=50, value=10, key="quiz_num_questions")
 
     if st.button("Generate Quiz"):
         process_audio(audio_file, youtube_url, generate_quiz, num_questions)
 
+    render_stored_output("quiz")
+
 def render_footer():
     st.markdown("---")
     st.write("<p style='font-family:Arial; font-size:14px; color:#7F8C8D;'>© 2024 AI-Powered Teaching Assistant</p>", unsafe_allow_html=True)
@@ -228,6 +254,7 @@ def main():
     st.markdown("<style>body { background-color: #FFFFFF; }</style>", unsafe_allow_html=True)
     st.sidebar.title("Navigation")
     page = st.sidebar.radio("Go to", ["Home", "Lecture Notes", "Quiz Generation"])
+    render_scratch_space_metric()
 
     if page == "Home":
         render_homepage()
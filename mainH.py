@@ -1,26 +1,36 @@
 import streamlit as st
+import html
 import requests
 from pytube import YouTube
-import tempfile
-import shutil
 import os
+import sqlite3
+from datetime import datetime
 from fpdf import FPDF
 from docx import Document
 import fitz  # PyMuPDF
-from groq import Groq
-
-# Function to get a temporary directory
-def get_temp_dir():
-    return tempfile.mkdtemp()
-
-
-# Function to download YouTube audio
-def download_youtube_audio(youtube_url, temp_dir):
+from live_lecture import LiveLectureSession, format_timestamp, DEEPGRAM_API_URL
+from quiz_generation import generate_sharded_quiz
+from output_viewer import render_output_viewer
+from lecture_index import index_lecture, add_lecture_document, passages_from_transcript, search_lectures
+from scratch_space import scratch_space, ScratchSpaceFull, download_size, render_scratch_space_metric
+from model_router import complete_with_chunking, model_metrics, PromptTooLarge
+
+# Function to find the audio stream of a YouTube video
+def get_youtube_audio_stream(youtube_url):
     try:
         yt = YouTube(youtube_url)
         stream = yt.streams.filter(only_audio=True).first()
         if not stream:
             raise ValueError("No audio stream found in the YouTube video.")
+        return stream
+    except Exception as e:
+        st.error(f"Error downloading YouTube video: {e}")
+        return None
+
+
+# Function to download YouTube audio
+def download_youtube_audio(stream, temp_dir):
+    try:
         temp_file_path = os.path.join(temp_dir, "audio.mp4")
         stream.download(output_path=temp_dir, filename="audio.mp4")
         return temp_file_path
@@ -29,59 +39,82 @@ def download_youtube_audio(youtube_url, temp_dir):
         return None
 
 
-# Function to clean up temporary files
-def clean_up_temp_files(temp_dir):
-    shutil.rmtree(temp_dir)
-
+# Function to show per-model latency and token usage in the sidebar
+def render_model_metrics():
+    metrics = model_metrics.snapshot()
+    if metrics:
+        with st.sidebar.expander("Model usage"):
+            st.table(metrics)
 
-# Function to render custom styles for the app
-def render_custom_styles():
-    st.markdown(
-        """
-        <style>
-        .generated-content {
-            height: 600px !important; /* Increase height to 600 pixels */
-            width: 100%; /* Set width to 100% */
-            overflow-y: auto; /* Enable vertical scroll if content exceeds height */
-            border: 1px solid #ccc; /* Optional: Add border for visibility */
-            padding: 10px; /* Optional: Add padding for better readability */
-            margin-bottom: 20px; /* Optional: Add margin for spacing between content */
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
 
-
-# Function to transcribe audio using Deepgram API
+# Function to transcribe audio using Deepgram API, returning the transcript and its timed words
 def transcribe_audio_deepgram(audio_path, api_key):
     try:
         with open(audio_path, "rb") as audio_file:
-            response = requests.post("https://api.deepgram.com/v1/listen", headers={"Authorization": f"Token {api_key}", "Content-Type": "audio/wav"}, data=audio_file)
+            response = requests.post(DEEPGRAM_API_URL, headers={"Authorization": f"Token {api_key}", "Content-Type": "audio/wav"}, data=audio_file)
             response.raise_for_status()
-            transcription = response.json().get('results', {}).get('channels', [])[0].get('alternatives', [])[0].get('transcript')
-            return transcription
+            alternative = response.json().get('results', {}).get('channels', [])[0].get('alternatives', [])[0]
+            return alternative.get('transcript'), alternative.get('words', [])
     except Exception as e:
         st.error(f"Failed to transcribe audio: {e}")
-        return ""
+        return "", []
+
+
+# Function to save a transcript to the lecture search index, once per input so notes and quiz share one lecture
+def store_lecture(title, source, passages, input_key):
+    lecture_ids = st.session_state.setdefault("lecture_ids", {})
+    if input_key in lecture_ids:
+        st.session_state["lecture_id"] = lecture_ids[input_key]
+        return
+    try:
+        lecture_ids[input_key] = st.session_state["lecture_id"] = index_lecture(title, source, passages)
+    except sqlite3.Error as e:
+        st.session_state.pop("lecture_id", None)
+        st.warning(f"Could not save the lecture to the search index: {e}")
+
+
+# Function to keep generated notes or quiz in session state and in the lecture search index
+def save_output(kind, output):
+    st.session_state[f"{kind}_output"] = output
+    if "lecture_id" in st.session_state:
+        try:
+            add_lecture_document(st.session_state["lecture_id"], kind, output)
+        except sqlite3.Error as e:
+            st.warning(f"Could not save the {kind} to the search index: {e}")
 
 
 # Function to handle transcription from audio file or YouTube URL
 def transcribe_audio_and_get_transcription(audio_file, youtube_url, deepgram_api_key):
-    temp_dir = get_temp_dir()
-
+    transcription_output = ""
+    expected_bytes = 0
     if audio_file:
-        audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
-        with open(audio_path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
-
+        expected_bytes = audio_file.size
     elif youtube_url:
-        audio_path = download_youtube_audio(youtube_url, temp_dir)
-        if audio_path:
-            transcription_output = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+        stream = get_youtube_audio_stream(youtube_url)
+        if not stream:
+            return transcription_output
+        # Reserve the download up front so concurrent downloads wait for space instead of overrunning the quota
+        expected_bytes = download_size(stream)
+    try:
+        # The job directory is removed even if download or transcription fails
+        with scratch_space.job_dir(expected_bytes) as temp_dir:
+            if audio_file:
+                audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
+                with open(audio_path, "wb") as f:
+                    f.write(audio_file.getbuffer())
+                transcription_output, words = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+                if transcription_output:
+                    store_lecture(audio_file.name, "audio", passages_from_transcript(transcription_output, words), ("audio", audio_file.file_id))
+
+            elif youtube_url:
+                audio_path = download_youtube_audio(stream, temp_dir)
+                if audio_path:
+                    transcription_output, words = transcribe_audio_deepgram(audio_path, deepgram_api_key)
+                    if transcription_output:
+                        store_lecture(youtube_url, "youtube", passages_from_transcript(transcription_output, words), ("youtube", youtube_url))
+    except ScratchSpaceFull as e:
+        st.error(f"Server is busy: {e}")
 
-    clean_up_temp_files(temp_dir)
     return transcription_output
 
 
@@ -100,29 +133,31 @@ def extract_text_from_docx(file):
     return "\n".join([para.text for para in doc.paragraphs])
 
 
-# Function to generate lecture notes using Groq API
-def generate_notes(transcription, api_key, lesson_plan_text=None):
-    client = Groq(api_key=api_key)
+# Function to build the lecture notes prompt for a transcription
+def build_notes_prompt(transcription, lesson_plan_text=None):
     prompt = f"""Create detailed lecture notes summarizing the key concepts discussed in the provided transcription. Highlight important topics and keep the notes concise and organized.
     After the notes, create a structured document with the discussed topics and associated timestamps from the original transcription. Ensure the timestamps accurately reflect the timing of each topic's discussion:\n\n{transcription}"""
     if lesson_plan_text:
         prompt += f"\n\nPlease ensure the notes align with the following lesson plan:\n\n{lesson_plan_text}"
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    return prompt
+
+
+# Function to generate lecture notes using Groq API, routed to the fastest model that fits the transcript
+def generate_notes(transcription, api_key, lesson_plan_text=None):
+    try:
+        return complete_with_chunking(lambda text: build_notes_prompt(text, lesson_plan_text), transcription, api_key, "notes")
+    except PromptTooLarge as e:
+        st.error(f"The transcript is too long to generate notes: {e}")
+        return ""
 
 
-# Function to generate quiz using Groq API
+# Function to generate quiz using Groq API, one request per transcript segment in parallel
 def generate_quiz(transcription, api_key, num_questions):
-    client = Groq(api_key=api_key)
-    prompt = f"Generate {num_questions} multiple-choice questions with answers given at the end for all the questions, keep a balance of easy, moderate and difficult questions from the following transcription:\n\n{transcription}"
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    try:
+        return generate_sharded_quiz(transcription, api_key, num_questions)
+    except PromptTooLarge as e:
+        st.error(f"The transcript is too long to generate a quiz: {e}")
+        return ""
 
 
 # Function to create a PDF document
@@ -169,43 +204,49 @@ def render_inputs(key):
 
 # Function to process audio file or YouTube URL and generate notes or quiz
 def process_audio(audio_file, youtube_url, generate_func, num_questions=None, lesson_plan_text=None):
-    temp_dir = get_temp_dir()
-
     if audio_file:
         st.success("Processing the audio file...")
-        audio_path = os.path.join(temp_dir, f"temp_audio.{audio_file.name.split('.')[-1]}")
-        with open(audio_path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        transcription_output = transcribe_audio_deepgram(audio_path, st.session_state["deepgram_api_key"])
-
     elif youtube_url:
         st.success("Processing the YouTube video...")
-        audio_path = download_youtube_audio(youtube_url, temp_dir)
-        if audio_path:
-            transcription_output = transcribe_audio_deepgram(audio_path, st.session_state["deepgram_api_key"])
+    transcription_output = transcribe_audio_and_get_transcription(audio_file, youtube_url, st.session_state["deepgram_api_key"])
 
     if transcription_output:
+        # Store output in session state so it survives reruns while it is being viewed
         if generate_func.__name__ == "generate_notes":
             output = generate_func(transcription_output, st.session_state["groq_api_key"], lesson_plan_text)
+            if output:
+                save_output("notes", output)
         else:
             output = generate_func(transcription_output, st.session_state["groq_api_key"], num_questions)
-        st.markdown(f'<div class="generated-content">{output}</div>', unsafe_allow_html=True)
-        render_download_options(output, generate_func.__name__)
+            if output:
+                save_output("quiz", output)
 
-    clean_up_temp_files(temp_dir)
+
+# Function to build the PDF and Word exports once per output, so reruns of the viewer do not rebuild them
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_exports(output):
+    with scratch_space.job_dir() as export_dir:
+        pdf_path = os.path.join(export_dir, "export.pdf")
+        create_pdf(output, pdf_path)
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        word_path = os.path.join(export_dir, "export.docx")
+        create_word_doc(output, word_path)
+        with open(word_path, "rb") as f:
+            word_bytes = f.read()
+    return pdf_bytes, word_bytes
 
 
 # Function to render download options for generated content
 def render_download_options(output, output_type):
     #st.download_button(f"Download {output_type} as TXT", output, file_name=f"{output_type}.txt")
-    pdf_file = f"{output_type}.pdf"
-    create_pdf(output, pdf_file)
-    with open(pdf_file, "rb") as f:
-        st.download_button(f"Download {output_type} as PDF", f, file_name=pdf_file)
-    word_file = f"{output_type}.docx"
-    create_word_doc(output, word_file)
-    with open(word_file, "rb") as f:
-        st.download_button(f"Download {output_type} as Word Document", f, file_name=word_file)
+    try:
+        pdf_bytes, word_bytes = build_exports(output)
+    except ScratchSpaceFull as e:
+        st.error(f"Server is busy: {e}")
+        return
+    st.download_button(f"Download {output_type} as PDF", pdf_bytes, file_name=f"{output_type}.pdf")
+    st.download_button(f"Download {output_type} as Word Document", word_bytes, file_name=f"{output_type}.docx")
 
 
 # Function to render the notes and quiz generation page
@@ -232,7 +273,7 @@ def render_notes_and_quiz_page():
         else:
             st.error("Unsupported file type. Please upload a PDF or DOCX file.")
 
-    num_questions = st.number_input("Number of quiz questions", min_value=5, max_value=20, value=10, step=1, key="notes_quiz_num_questions")
+    num_questions = st.number_input("Number of quiz questions", min_value=5, max_value=50, value=10, step=1, key="notes_quiz_num_questions")
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -255,21 +296,23 @@ def render_notes_and_quiz_page():
                 combined_transcription = transcribe_audio_and_get_transcription(audio_file, youtube_url, st.session_state["deepgram_api_key"])
                 if combined_transcription:
                     notes_output = generate_notes(combined_transcription, st.session_state["groq_api_key"], lesson_plan_text)
-                    st.session_state["notes_output"] = notes_output  # Store notes output in session state
-                    st.markdown(f'<div class="generated-content">{notes_output}</div>', unsafe_allow_html=True)
+                    if notes_output:
+                        save_output("notes", notes_output)  # Store notes output in session state
 
                     quiz_output = generate_quiz(combined_transcription, st.session_state["groq_api_key"], int(num_questions))
-                    st.session_state["quiz_output"] = quiz_output  # Store quiz output in session state
-                    st.markdown(f'<div class="generated-content">{quiz_output}</div>', unsafe_allow_html=True)
+                    if quiz_output:
+                        save_output("quiz", quiz_output)  # Store quiz output in session state
             else:
                 st.error("Please upload an audio file or enter a YouTube URL.")
 
 
-    # Render download buttons based on session state
+    # Render outputs and download buttons based on session state
     if "notes_output" in st.session_state:
+        render_output_viewer(st.session_state["notes_output"], "notes")
         render_download_options(st.session_state["notes_output"], "Notes")
 
     if "quiz_output" in st.session_state:
+        render_output_viewer(st.session_state["quiz_output"], "quiz")
         render_download_options(st.session_state["quiz_output"], "Quiz")
 
 
@@ -292,6 +335,99 @@ def render_notes_and_quiz_page():
         </style>
     """, unsafe_allow_html=True)
 
+# Function to render the live lecture page with rolling notes
+def render_live_lecture_page():
+    st.title("Live Lecture")
+    st.markdown("<p style='font-family:Arial; font-size:16px;'>Record the lecture part by part as it happens. Each part is transcribed right away and the notes are updated every few minutes.</p>", unsafe_allow_html=True)
+
+    update_minutes = st.number_input("Update notes every (minutes)", min_value=1, max_value=15, value=3, step=1, key="live_update_minutes")
+
+    if st.button("Start New Live Session"):
+        st.session_state["live_session"] = LiveLectureSession(st.session_state["deepgram_api_key"], st.session_state["groq_api_key"], update_interval=int(update_minutes) * 60)
+
+    session = st.session_state.get("live_session")
+    if not session:
+        if "notes_output" in st.session_state:
+            render_output_viewer(st.session_state["notes_output"], "live_notes")
+            render_download_options(st.session_state["notes_output"], "Notes")
+        return
+    session.update_interval = int(update_minutes) * 60
+
+    # The recorder keeps one key per live session and each new recording is processed exactly once,
+    # so a rerun never loses a recording and a failed part is not sent to Deepgram again
+    audio_chunk = st.audio_input("Record the next part of the lecture", key=f"live_chunk_{session.id}")
+    if audio_chunk and audio_chunk.file_id != session.last_chunk_id:
+        session.last_chunk_id = audio_chunk.file_id
+        try:
+            update_due = session.add_chunk(audio_chunk.getvalue(), audio_chunk.type or "audio/wav")
+        except Exception as e:
+            update_due = False
+            st.error(f"Failed to transcribe the recorded audio, this part was skipped. Please record it again: {e}")
+        # The transcript of this part is kept even if the summary fails, the next update covers it again
+        if update_due:
+            try:
+                if session.update_notes():
+                    st.success("Notes updated.")
+            except Exception as e:
+                st.warning(f"Notes update failed, will retry on the next part: {e}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Update Notes Now"):
+            try:
+                session.update_notes()
+            except PromptTooLarge as e:
+                st.error(f"Failed to update the notes: {e}")
+    with col2:
+        if st.button("End Live Session"):
+            try:
+                session.update_notes()
+            except PromptTooLarge as e:
+                st.error(f"Failed to update the notes, saving the notes so far: {e}")
+            # An empty session has nothing to index and must not attach its notes to an earlier lecture
+            if session.segments:
+                title = f"Live lecture {datetime.now():%Y-%m-%d %H:%M}"
+                store_lecture(title, "live", [(text, int(start * 1000), int(end * 1000)) for start, end, text in session.segments], ("live", session.id))
+                save_output("notes", session.notes)
+            del st.session_state["live_session"]
+            st.rerun()
+
+    st.write(f"Recorded {session.chunks_received} parts, {session.elapsed / 60:.1f} minutes of audio.")
+    if session.notes:
+        render_output_viewer(session.notes, "live_notes")
+    with st.expander("Live transcript"):
+        st.text(session.transcript)
+
+# Function to render the search page over all processed lectures
+def render_search_page():
+    st.title("Search Lectures")
+    query = st.text_input("Search transcripts, notes and quizzes of processed lectures", key="lecture_search_query")
+    if not query:
+        return
+
+    try:
+        results = search_lectures(query)
+    except sqlite3.Error as e:
+        st.error(f"Failed to search lectures: {e}")
+        return
+    if not results:
+        st.info("No matching lectures found.")
+        return
+
+    # Group matches by lecture, keeping the best matching lecture first
+    lectures = {}
+    for result in results:
+        lectures.setdefault(result["lecture_id"], []).append(result)
+    for matches in lectures.values():
+        st.markdown(f"<h3 style='font-family:Georgia; font-size:20px;'>{html.escape(matches[0]['title'])}</h3>", unsafe_allow_html=True)
+        st.caption(f"{matches[0]['source']} - processed {matches[0]['created_at']}")
+        for match in matches:
+            if match["start_ms"] is not None:
+                location = f"{match['start_ms']} ms ({format_timestamp(match['start_ms'] / 1000)})"
+            else:
+                location = match["kind"]
+            st.markdown(f"- **{location}**: {match['snippet']}")
+
 def clear_session_state_downloads():
     # Clear previously stored outputs in session state
     if "notes_output" in st.session_state:
@@ -300,6 +436,9 @@ def clear_session_state_downloads():
     if "quiz_output" in st.session_state:
         del st.session_state["quiz_output"]
 
+    if "lecture_id" in st.session_state:
+        del st.session_state["lecture_id"]
+
 def render_footer():
     st.markdown("---")
     st.write("<p style='font-family:Arial; font-size:14px; color:#7F8C8D;'>© 2024 AI-Powered Teaching Assistant</p>", unsafe_allow_html=True)
@@ -309,14 +448,19 @@ def render_footer():
 def main():
     st.set_page_config(page_title="AI-Powered Teaching Assistant", page_icon=":books:", layout="wide")
     st.markdown("<style>body { background-color: #FFFFFF; }</style>", unsafe_allow_html=True)
-    render_custom_styles()
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Home", "Notes and Quiz Generation"])
+    page = st.sidebar.radio("Go to", ["Home", "Notes and Quiz Generation", "Live Lecture", "Search Lectures"])
+    render_scratch_space_metric()
+    render_model_metrics()
 
     if page == "Home":
         render_homepage()
     elif page == "Notes and Quiz Generation":
         render_notes_and_quiz_page()
+    elif page == "Live Lecture":
+        render_live_lecture_page()
+    elif page == "Search Lectures":
+        render_search_page()
 
     render_footer()
 
@@ -0,0 +1,171 @@
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from groq import Groq, APIStatusError, RateLimitError, InternalServerError
+
+# Configured models, fastest first. Override with a JSON list in MODEL_ROUTES to tune routing.
+DEFAULT_MODEL_ROUTES = [
+    {"model": "llama3-8b-8192", "context_tokens": 8192, "tasks": ["notes", "quiz"]},
+    {"model": "mixtral-8x7b-32768", "context_tokens": 32768, "tasks": ["notes", "quiz"]},
+    {"model": "llama-3.1-70b-versatile", "context_tokens": 131072, "tasks": ["notes", "quiz"]},
+]
+MODEL_ROUTES = json.loads(os.environ["MODEL_ROUTES"]) if os.environ.get("MODEL_ROUTES") else DEFAULT_MODEL_ROUTES
+# Tokens kept free for the answer of each task
+COMPLETION_TOKENS = {"notes": 2048, "quiz": 1024}
+# Rough size of a token, used to estimate prompt tokens before sending a request
+CHARS_PER_TOKEN = 4
+# Times a chunk is split again when a model still rejects it as too long
+MAX_CHUNK_SPLITS = 3
+# Optional JSON lines file that receives one record per model request
+MODEL_METRICS_LOG = os.environ.get("MODEL_METRICS_LOG")
+
+
+class PromptTooLarge(Exception):
+    pass
+
+
+# Function to estimate the number of tokens in a prompt
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# Function to tell whether a Groq error means the prompt does not fit the model
+def is_context_error(error):
+    message = str(error).lower()
+    return isinstance(error, APIStatusError) and (
+        error.status_code == 413 or "context_length" in message or "context length" in message or "reduce the length" in message
+    )
+
+
+# Function to tell whether a Groq error means the model is out of capacity right now
+def is_capacity_error(error):
+    return isinstance(error, (RateLimitError, InternalServerError)) or (isinstance(error, APIStatusError) and error.status_code == 498)
+
+
+# Per-model request counts, latency and token usage, shared by all sessions of this process
+class ModelMetrics:
+    def __init__(self, log_path=MODEL_METRICS_LOG):
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.models = {}
+
+    def record(self, model, task, outcome, latency, estimated_tokens, usage=None):
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        with self.lock:
+            entry = self.models.setdefault(model, {"requests": 0, "failures": 0, "latency_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["requests"] += 1
+            entry["failures"] += outcome != "ok"
+            entry["latency_seconds"] += latency
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            if self.log_path:
+                record = {"time": time.time(), "model": model, "task": task, "outcome": outcome, "latency_seconds": round(latency, 3),
+                          "estimated_prompt_tokens": estimated_tokens, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                {
+                    "model": model,
+                    "requests": entry["requests"],
+                    "failures": entry["failures"],
+                    "avg_latency_seconds": round(entry["latency_seconds"] / entry["requests"], 2),
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "completion_tokens": entry["completion_tokens"],
+                }
+                for model, entry in self.models.items()
+            ]
+
+
+model_metrics = ModelMetrics()
+
+
+# Function to list the configured models for a task that can hold a prompt of the given size, fastest first
+def candidate_models(task, prompt_tokens):
+    needed = prompt_tokens + COMPLETION_TOKENS.get(task, 0)
+    return [route for route in MODEL_ROUTES if task in route["tasks"] and route["context_tokens"] >= needed]
+
+
+# Function to send a prompt to the fastest model that fits, falling back to other models on context or capacity errors
+def route_completion(prompt, api_key, task):
+    estimated_tokens = estimate_tokens(prompt)
+    candidates = candidate_models(task, estimated_tokens)
+    if not candidates:
+        raise PromptTooLarge(f"Prompt of about {estimated_tokens} tokens does not fit any configured model for {task}.")
+
+    last_error = None
+    min_context = 0
+    for position, route in enumerate(candidates):
+        # After a context error only models with a larger context are worth trying
+        if route["context_tokens"] <= min_context:
+            continue
+        # Fall back right away instead of retrying while another model is left
+        client = Groq(api_key=api_key, max_retries=2 if position == len(candidates) - 1 else 0)
+        start = time.perf_counter()
+        try:
+            response = client.chat.completions.create(
+                model=route["model"],
+                messages=[{"role": "user", "content": prompt}]
+            )
+        except APIStatusError as e:
+            if is_context_error(e):
+                model_metrics.record(route["model"], task, "context_error", time.perf_counter() - start, estimated_tokens)
+                min_context = route["context_tokens"]
+            elif is_capacity_error(e):
+                model_metrics.record(route["model"], task, "capacity_error", time.perf_counter() - start, estimated_tokens)
+            else:
+                model_metrics.record(route["model"], task, "error", time.perf_counter() - start, estimated_tokens)
+                raise
+            last_error = e
+            continue
+        model_metrics.record(route["model"], task, "ok", time.perf_counter() - start, estimated_tokens, response.usage)
+        return response.choices[0].message.content.strip()
+
+    if min_context and is_context_error(last_error):
+        raise PromptTooLarge(f"Prompt of about {estimated_tokens} tokens was rejected by every configured model for {task}.") from last_error
+    raise last_error
+
+
+# Function to split text on word boundaries into chunks of at most max_chars, by default sized to fit the largest model for a task
+def split_for_context(text, task, overhead_tokens, max_chars=None):
+    if max_chars is None:
+        max_context = max((route["context_tokens"] for route in MODEL_ROUTES if task in route["tasks"]), default=0)
+        max_chars = (max_context - overhead_tokens - COMPLETION_TOKENS.get(task, 0)) * CHARS_PER_TOKEN
+    if max_chars <= 0:
+        raise PromptTooLarge(f"No configured model for {task} has room for the prompt.")
+    chunks = []
+    current = []
+    current_chars = 0
+    for word in text.split():
+        if current and current_chars + len(word) + 1 > max_chars:
+            chunks.append(" ".join(current))
+            current = []
+            current_chars = 0
+        current.append(word)
+        current_chars += len(word) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+# Function to complete a prompt over the whole text, or over chunks of it in parallel when no model can hold it
+def complete_with_chunking(build_prompt, text, api_key, task, splits_left=MAX_CHUNK_SPLITS):
+    try:
+        return route_completion(build_prompt(text), api_key, task)
+    except PromptTooLarge:
+        if splits_left <= 0:
+            raise
+        chunks = split_for_context(text, task, estimate_tokens(build_prompt("")))
+        if len(chunks) < 2:
+            # The estimate said the text fits but a model rejected it, so split below the rejected length
+            chunks = split_for_context(text, task, 0, max_chars=len(text) // 2 + 1)
+        if len(chunks) < 2:
+            raise
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            return "\n\n".join(executor.map(lambda chunk: complete_with_chunking(build_prompt, chunk, api_key, task, splits_left - 1), chunks))
@@ -0,0 +1,88 @@
+import html
+import re
+import streamlit as st
+
+# Largest amount of generated text rendered on a single page of the viewer
+SECTION_MAX_CHARS = 3000
+SECTION_TITLE_CHARS = 60
+VIEWER_HEIGHT = 600
+HEADING_LINE = re.compile(r"^\s*(?:#{1,6}\s+|\*\*[^*]+\*\*:?\s*$)")
+
+
+# Function to break a paragraph that does not fit on one page into page-sized pieces
+def split_long_paragraph(paragraph, max_chars):
+    pieces = []
+    current = ""
+    for line in paragraph.splitlines():
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+# Function to title a section after its first line
+def section_title(body):
+    first_line = body.strip().splitlines()[0] if body.strip() else ""
+    title = first_line.strip("#*: ").strip()
+    if len(title) > SECTION_TITLE_CHARS:
+        title = title[:SECTION_TITLE_CHARS].rstrip() + "..."
+    return title or "Untitled"
+
+
+# Function to split generated output into page-sized sections, starting new sections at headings
+@st.cache_data(show_spinner=False, max_entries=32)
+def split_into_sections(text, max_chars=SECTION_MAX_CHARS):
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        if len(paragraph) > max_chars:
+            paragraphs.extend(split_long_paragraph(paragraph, max_chars))
+        elif paragraph.strip():
+            paragraphs.append(paragraph)
+
+    sections = []
+    current = ""
+    for paragraph in paragraphs:
+        starts_heading = HEADING_LINE.match(paragraph) and len(current) >= max_chars // 2
+        if current and (starts_heading or len(current) + len(paragraph) + 2 > max_chars):
+            sections.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        sections.append(current)
+    return [(section_title(body), body) for body in sections] or [("Untitled", "")]
+
+
+# Function to render generated output one section at a time with in-document search
+def render_output_viewer(output, key):
+    sections = split_into_sections(output)
+
+    query = st.text_input("Search in document", key=f"{key}_viewer_search").strip()
+    if query:
+        matches = [i for i, (_, body) in enumerate(sections) if query.lower() in body.lower()]
+        if not matches:
+            st.info(f"No matches for '{query}'.")
+            return
+        st.write(f"Found '{query}' in {len(matches)} of {len(sections)} sections.")
+    else:
+        matches = list(range(len(sections)))
+
+    index = st.selectbox("Section", matches, format_func=lambda i: f"{i + 1}/{len(sections)} - {sections[i][0]}", key=f"{key}_viewer_section")
+    body = sections[index][1]
+    with st.container(height=VIEWER_HEIGHT, border=True):
+        if query:
+            # Escape each piece of the generated text so only the highlight marks are rendered as HTML;
+            # splitting on a captured query puts the matches at the odd positions
+            pieces = re.split(f"({re.escape(query)})", body, flags=re.IGNORECASE)
+            body = "".join(f"<mark>{html.escape(piece, quote=False)}</mark>" if i % 2 else html.escape(piece, quote=False) for i, piece in enumerate(pieces))
+            st.markdown(body, unsafe_allow_html=True)
+        else:
+            st.markdown(body)
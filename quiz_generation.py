@@ -0,0 +1,160 @@
+import math
+import re
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+import numpy as np
+from model_router import route_completion, PromptTooLarge
+
+# Questions asked of each transcript segment, so every completion stays small
+QUESTIONS_PER_SHARD = 5
+# Segments shorter than this are not worth a completion of their own
+MIN_SHARD_WORDS = 300
+# Extra questions requested per segment to absorb duplicates without a top-up round
+SHARD_OVERSAMPLE = 1
+# Cosine similarity above which two questions are treated as duplicates
+DUPLICATE_THRESHOLD = 0.8
+SIMILARITY_DIMENSIONS = 1024
+MAX_TOP_UP_ROUNDS = 2
+
+QUESTION_FORMAT = """Write each question exactly in this format, with a blank line between questions:
+Question: <question text>
+A) <option>
+B) <option>
+C) <option>
+D) <option>
+Answer: <correct letter>) <correct option>"""
+
+# "Question: ...", "Q1: ..." or a numbered line such as "1. What is ...?"
+QUESTION_START = re.compile(r"^\s*(?:\*\*)?(?:(?:\d+[.)]\s*)?Q(?:uestion)?\s*\d*\s*[:.]|\d+[.)])\s*(?:\*\*)?\s*", re.IGNORECASE)
+OPTION_LINE = re.compile(r"^\s*\(?([A-Da-d])[).:]\s+(.*)")
+ANSWER_LINE = re.compile(r"^\s*(?:\*\*)?(?:Correct\s+)?Answer\s*[:.]\s*(?:\*\*)?\s*(.*)", re.IGNORECASE)
+
+
+# Function to split a transcription into roughly equal segments on word boundaries
+def split_transcript(transcription, num_shards):
+    words = transcription.split()
+    if not words:
+        return [transcription]
+    num_shards = max(1, min(num_shards, len(words) // MIN_SHARD_WORDS))
+    shard_size = math.ceil(len(words) / num_shards)
+    return [" ".join(words[i:i + shard_size]) for i in range(0, len(words), shard_size)]
+
+
+# Function to parse generated quiz text into question dictionaries
+def parse_questions(text):
+    questions = []
+    current = None
+    for line in text.splitlines():
+        if QUESTION_START.match(line):
+            current = {"question": QUESTION_START.sub("", line, count=1).strip().strip("*").strip(), "options": [], "answer": ""}
+            questions.append(current)
+        elif current is None or not line.strip():
+            continue
+        elif ANSWER_LINE.match(line):
+            current["answer"] = ANSWER_LINE.match(line).group(1).strip()
+        elif OPTION_LINE.match(line):
+            letter, option = OPTION_LINE.match(line).groups()
+            current["options"].append(f"{letter.upper()}) {option.strip()}")
+        elif not current["options"]:
+            current["question"] += " " + line.strip()
+    return [q for q in questions if q["question"] and q["options"]]
+
+
+# Function to generate questions for one transcript segment using Groq API
+def generate_quiz_shard(segment, api_key, num_questions, avoid_questions=None):
+    prompt = f"Generate {num_questions} multiple-choice questions, keep a balance of easy, moderate and difficult questions from the following part of a lecture transcription.\n\n{QUESTION_FORMAT}"
+    if avoid_questions:
+        avoid_list = "\n".join(f"- {q}" for q in avoid_questions)
+        prompt += f"\n\nDo not repeat or rephrase any of these existing questions:\n{avoid_list}"
+    prompt += f"\n\nTranscription:\n\n{segment}"
+    try:
+        return route_completion(prompt, api_key, "quiz")
+    except PromptTooLarge:
+        # Fall back to asking each half of the segment for half of the questions
+        words = segment.split()
+        if len(words) < 2:
+            raise
+        half = len(words) // 2
+        parts = [" ".join(words[:half]), " ".join(words[half:])]
+        return "\n\n".join(generate_quiz_shard(part, api_key, math.ceil(num_questions / 2), avoid_questions) for part in parts)
+
+
+# Function to embed questions as normalized hashed bag-of-words vectors
+def vectorize_questions(questions):
+    vectors = np.zeros((len(questions), SIMILARITY_DIMENSIONS), dtype=np.float32)
+    for row, question in enumerate(questions):
+        tokens = re.findall(r"[a-z0-9]+", " ".join([question["question"]] + question["options"]).lower())
+        buckets = [zlib.crc32(token.encode()) % SIMILARITY_DIMENSIONS for token in tokens]
+        np.add.at(vectors[row], buckets, 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+# Function to drop questions that are near-duplicates of an earlier question
+def remove_duplicate_questions(questions, threshold=DUPLICATE_THRESHOLD):
+    if len(questions) < 2:
+        return list(questions)
+    vectors = vectorize_questions(questions)
+    similarity = vectors @ vectors.T
+    duplicate = np.triu(similarity > threshold, k=1).any(axis=0)
+    return [q for q, is_duplicate in zip(questions, duplicate) if not is_duplicate]
+
+
+# Function to take questions from each segment in turn so the quiz covers the whole lecture
+def interleave_shards(shard_questions):
+    return [q for round_questions in zip_longest(*shard_questions) for q in round_questions if q is not None]
+
+
+# Function to format questions with the answers given at the end
+def format_quiz(questions):
+    lines = []
+    for number, question in enumerate(questions, start=1):
+        lines.append(f"{number}. {question['question']}")
+        lines.extend(question["options"])
+        lines.append("")
+    lines.append("Answers:")
+    for number, question in enumerate(questions, start=1):
+        lines.append(f"{number}. {question['answer']}")
+    return "\n".join(lines)
+
+
+# Function to number unparsed quiz blocks from each segment in turn when no questions could be parsed
+def format_unparsed_quiz(outputs, num_questions):
+    # Blocks without options, such as an introduction line, are not questions
+    shard_blocks = [[block.strip() for block in re.split(r"\n\s*\n", output) if "\n" in block.strip()] for output in outputs]
+    blocks = interleave_shards(shard_blocks)[:num_questions]
+    return "\n\n".join(f"{number}. {QUESTION_START.sub('', block, count=1)}" for number, block in enumerate(blocks, start=1))
+
+
+# Function to parse the questions of one segment, remembering which segment they came from
+def parse_shard_questions(output, segment_index):
+    questions = parse_questions(output)
+    for question in questions:
+        question["segment"] = segment_index
+    return questions
+
+
+# Function to generate a quiz from transcript segments in parallel using Groq API
+def generate_sharded_quiz(transcription, api_key, num_questions):
+    segments = split_transcript(transcription, math.ceil(num_questions / QUESTIONS_PER_SHARD))
+    per_shard = math.ceil(num_questions / len(segments)) + SHARD_OVERSAMPLE
+
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        outputs = list(executor.map(lambda segment: generate_quiz_shard(segment, api_key, per_shard), segments))
+    questions = remove_duplicate_questions(interleave_shards([parse_shard_questions(output, i) for i, output in enumerate(outputs)]))
+    if not questions:
+        return format_unparsed_quiz(outputs, num_questions)
+
+    # Top up from the segment with the fewest questions so far until the requested count is reached
+    for _ in range(MAX_TOP_UP_ROUNDS):
+        missing = num_questions - len(questions)
+        if missing <= 0:
+            break
+        counts = Counter(q["segment"] for q in questions)
+        segment_index = min(range(len(segments)), key=lambda i: counts[i])
+        output = generate_quiz_shard(segments[segment_index], api_key, missing + SHARD_OVERSAMPLE, [q["question"] for q in questions])
+        questions = remove_duplicate_questions(questions + parse_shard_questions(output, segment_index))
+
+    return format_quiz(questions[:num_questions])
@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import streamlit as st
+
+SCRATCH_ROOT = os.environ.get("SCRATCH_ROOT", os.path.join(tempfile.gettempdir(), "teaching-assistant"))
+# Total bytes all jobs together may keep in the scratch space
+SCRATCH_QUOTA_BYTES = int(os.environ.get("SCRATCH_QUOTA_BYTES", 2 * 1024 ** 3))
+# Bytes reserved for a download whose size is not known up front
+DEFAULT_DOWNLOAD_BYTES = int(os.environ.get("SCRATCH_DEFAULT_DOWNLOAD_BYTES", 200 * 1024 ** 2))
+# How long a job waits for space to be freed before giving up
+SCRATCH_WAIT_SECONDS = 60
+# Entries not owned by a running job are reaped once they are this old
+ORPHAN_MAX_AGE_SECONDS = 60 * 60
+REAP_INTERVAL_SECONDS = 5 * 60
+
+
+class ScratchSpaceFull(OSError):
+    pass
+
+
+# Function to measure the bytes used by all files below a path
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+# Function to get the bytes to reserve for a download stream, falling back to the configured default
+def download_size(stream):
+    try:
+        return stream.filesize or DEFAULT_DOWNLOAD_BYTES
+    except Exception:
+        return DEFAULT_DOWNLOAD_BYTES
+
+
+# Per-job scratch directories under one root, bounded by a shared disk quota
+class ScratchSpaceManager:
+    def __init__(self, root=SCRATCH_ROOT, quota_bytes=SCRATCH_QUOTA_BYTES, max_age=ORPHAN_MAX_AGE_SECONDS, reap_interval=REAP_INTERVAL_SECONDS):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.reap_interval = reap_interval
+        self.jobs = {}  # job directory -> bytes reserved for it
+        self.condition = threading.Condition()
+        self.reaper = None
+        os.makedirs(self.root, exist_ok=True)
+
+    # Bytes on disk plus the part of each reservation that has not been written yet
+    def committed_bytes(self):
+        usage = dir_size(self.root)
+        pending = sum(max(0, reserved - dir_size(path)) for path, reserved in self.jobs.items())
+        return usage + pending
+
+    # Create a directory for one job, waiting while the quota is used up, and always remove it afterwards
+    @contextmanager
+    def job_dir(self, expected_bytes=0, timeout=SCRATCH_WAIT_SECONDS):
+        if expected_bytes > self.quota_bytes:
+            raise ScratchSpaceFull(f"Job needs {expected_bytes} bytes but the scratch quota is {self.quota_bytes} bytes.")
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.committed_bytes() + expected_bytes > self.quota_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ScratchSpaceFull("Scratch space quota exceeded, please try again later.")
+                self.condition.wait(remaining)
+            path = tempfile.mkdtemp(dir=self.root)
+            self.jobs[path] = expected_bytes
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            with self.condition:
+                self.jobs.pop(path, None)
+                self.condition.notify_all()
+
+    # Remove files and directories that no running job owns and that are older than max_age
+    def reap_orphans(self):
+        cutoff = time.time() - self.max_age
+        removed = 0
+        with self.condition:
+            active = set(self.jobs)
+        for entry in os.scandir(self.root):
+            if entry.path in active:
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            with self.condition:
+                self.condition.notify_all()
+        return removed
+
+    def reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            self.reap_orphans()
+
+    # Start the background reaper once per process
+    def start_reaper(self):
+        with self.condition:
+            if self.reaper is None:
+                self.reaper = threading.Thread(target=self.reap_forever, name="scratch-space-reaper", daemon=True)
+                self.reaper.start()
+
+    def metrics(self):
+        with self.condition:
+            active_jobs = len(self.jobs)
+            reserved_bytes = sum(self.jobs.values())
+        return {
+            "usage_bytes": dir_size(self.root),
+            "quota_bytes": self.quota_bytes,
+            "reserved_bytes": reserved_bytes,
+            "active_jobs": active_jobs,
+        }
+
+
+# Shared by every session served by this process so the quota is global
+scratch_space = ScratchSpaceManager()
+scratch_space.start_reaper()
+
+
+# Function to show scratch disk usage in the sidebar
+def render_scratch_space_metric():
+    metrics = scratch_space.metrics()
+    st.sidebar.metric("Scratch disk usage", f"{metrics['usage_bytes'] / 1024 ** 2:.1f} MB", help=f"{metrics['active_jobs']} active jobs, quota {metrics['quota_bytes'] / 1024 ** 2:.0f} MB")